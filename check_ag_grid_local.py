@@ -1,72 +1,333 @@
 import os
 import json
 import argparse
+import functools
+import hashlib
+import mmap
+import re
+import threading
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+try:
+    # pathspec 用于解析 .gitignore，未安装时只跳过 SKIP_DIRS 中的目录
+    import pathspec
+except ImportError:
+    pathspec = None
+
+try:
+    # orjson 解析速度远快于标准库 json，未安装时回退
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+# 文件内容中需要查找的关键字
+KEYWORDS = ("ag-grid-community", "ag-grid-enterprise", "ag-grid-react", "ag-grid-angular", "ag-grid-vue")
+# 所有关键字编译为单个字节正则，一次扫描即可匹配全部关键字（re 会提取公共前缀 "ag-grid-"）
+KEYWORDS_PATTERN = re.compile(b"|".join(re.escape(k.encode()) for k in KEYWORDS))
+# 最长关键字的字节数，分块读取时相邻块需重叠 (该值 - 1) 字节
+KEYWORDS_MAX_LEN = max(len(k.encode()) for k in KEYWORDS)
+# 小于最短关键字的文件不可能命中，直接跳过
+KEYWORDS_MIN_LEN = min(len(k.encode()) for k in KEYWORDS)
+# 超过该大小的文件分块读取，避免整个文件映射进内存
+STREAM_THRESHOLD = 16 * 1024 * 1024
+STREAM_CHUNK_SIZE = 256 * 1024
+# 需要检查 CDN 或 import 语句的文件扩展名
+CONTENT_EXTENSIONS = frozenset({".html", ".js", ".jsx", ".ts", ".tsx"})
+# 可选跳过的类型声明文件（--skip-declarations）；它们同样可能 import ag-grid，跳过会牺牲检出率换取速度
+DECLARATION_SUFFIXES = (".d.ts",)
+# 遍历时跳过的目录
+SKIP_DIRS = frozenset({"node_modules", ".git", "dist", "build", "vendor", ".next", "__pycache__"})
+# 线程池中最多同时挂起的任务数
+MAX_PENDING = 1024
+# 文件扫描结果缓存，按 (mtime_ns, size) 判断文件是否变化
+CACHE_PATH = ".scan_cache.json"
+# package.json 解析结果缓存（按内容哈希），monorepo 中大量相同文件只解析一次
+PACKAGE_CACHE_SIZE = 4096
+_PACKAGE_CACHE = {}
+_PACKAGE_CACHE_LOCK = threading.Lock()
+# 文件内容扫描结果缓存（按内容哈希），重复的打包/压缩库只扫描一次；
+# 只对与已遍历文件大小相同、且不小于 DEDUPE_MIN_SIZE 的文件计算哈希，其余文件直接扫描
+DEDUPE_MIN_SIZE = 64 * 1024
+CONTENT_CACHE_SIZE = 4096
+_CONTENT_CACHE = {}
+_CONTENT_CACHE_LOCK = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def split_prefixes(dep_prefix):
+    """将逗号分隔的依赖前缀拆分为元组，供 str.startswith 一次匹配多个前缀"""
+    return tuple(p.strip() for p in dep_prefix.split(",") if p.strip())
+
+def _memo_get(cache, lock, key):
+    """从 LRU 字典缓存中取值，命中时移到末尾；返回 (是否命中, 值)"""
+    with lock:
+        if key in cache:
+            cache[key] = cache.pop(key)
+            return True, cache[key]
+    return False, None
+
+def _memo_put(cache, lock, key, value, max_size):
+    """写入 LRU 字典缓存，超出容量时淘汰最久未使用的条目"""
+    with lock:
+        cache[key] = value
+        if len(cache) > max_size:
+            del cache[next(iter(cache))]
+
+def _find_dep(raw, dep_prefix):
+    """解析 package.json 内容，返回第一个匹配前缀的依赖名（无匹配返回 None）"""
+    digest = hashlib.blake2b(raw, digest_size=16).digest()
+    cache_key = (digest, dep_prefix)
+    hit, found = _memo_get(_PACKAGE_CACHE, _PACKAGE_CACHE_LOCK, cache_key)
+    if hit:
+        return found
+
+    data = json_loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("package.json is not a JSON object")
+    prefixes = split_prefixes(dep_prefix)
+    deps = data.get("dependencies")
+    dev_deps = data.get("devDependencies")
+    found = None
+    for key in chain(deps if isinstance(deps, dict) else (), dev_deps if isinstance(dev_deps, dict) else ()):
+        if key.startswith(prefixes):
+            found = key
+            break
+
+    _memo_put(_PACKAGE_CACHE, _PACKAGE_CACHE_LOCK, cache_key, found, PACKAGE_CACHE_SIZE)
+    return found
+
 def check_package_json(file_path, dep_prefix="ag-grid"):
     """检查 package.json 是否包含 ag-grid 相关依赖"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            deps = {**data.get("dependencies", {}), **data.get("devDependencies", {})}
-            for key in deps:
-                if key.startswith(dep_prefix):
-                    return True, f"Found {key} in {file_path}"
+        with open(file_path, 'rb') as f:
+            key = _find_dep(f.read(), dep_prefix)
+            if key is not None:
+                return True, f"Found {key} in {file_path}"
             return False, f"No {dep_prefix} in {file_path}"
-    except (json.JSONDecodeError, FileNotFoundError):
+    except (ValueError, FileNotFoundError):
+        # ValueError 包括 JSON 解析错误以及顶层不是对象的情况
         return False, f"Invalid or missing {file_path}"
 
-def check_file_content(file_path, keywords=["ag-grid-community", "ag-grid-enterprise"]):
+def _search_stream(f, pattern, max_len):
+    """分块读取并搜索，保留上一块末尾 max_len - 1 字节以匹配跨块的关键字"""
+    tail = b""
+    while True:
+        chunk = f.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return None
+        buf = tail + chunk
+        match = pattern.search(buf)
+        if match:
+            return match
+        tail = buf[-(max_len - 1):] if max_len > 1 else b""
+
+def find_keyword(file_path, pattern=KEYWORDS_PATTERN, max_len=KEYWORDS_MAX_LEN, dedupe=False):
+    """返回文件中第一个匹配的关键字，未找到返回 None；dedupe 时按内容哈希复用扫描结果"""
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        # 空文件无法 mmap
+        if size == 0:
+            return None
+        if size > STREAM_THRESHOLD:
+            match = _search_stream(f, pattern, max_len)
+            return match.group(0).decode() if match else None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if not dedupe or size < DEDUPE_MIN_SIZE:
+                match = pattern.search(mm)
+                return match.group(0).decode() if match else None
+            # 可能重复的文件先按内容哈希查缓存，哈希与搜索共用同一次映射
+            cache_key = (hashlib.blake2b(mm, digest_size=16).digest(), pattern.pattern)
+            hit, keyword = _memo_get(_CONTENT_CACHE, _CONTENT_CACHE_LOCK, cache_key)
+            if not hit:
+                match = pattern.search(mm)
+                keyword = match.group(0).decode() if match else None
+                _memo_put(_CONTENT_CACHE, _CONTENT_CACHE_LOCK, cache_key, keyword, CONTENT_CACHE_SIZE)
+            return keyword
+
+def _content_result(file_path, keyword):
+    if keyword is not None:
+        return True, f"Found {keyword} in {file_path}"
+    return False, f"No ag-grid reference in {file_path}"
+
+def check_file_content(file_path, keywords=KEYWORDS, dedupe=False):
     """检查文件中是否包含 ag-grid 的 CDN 或 import 语句"""
+    if keywords is KEYWORDS:
+        pattern, max_len = KEYWORDS_PATTERN, KEYWORDS_MAX_LEN
+    else:
+        pattern = re.compile(b"|".join(re.escape(k.encode()) for k in keywords))
+        max_len = max(len(k.encode()) for k in keywords)
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            for keyword in keywords:
-                if keyword in content:
-                    return True, f"Found {keyword} in {file_path}"
-            return False, f"No ag-grid reference in {file_path}"
-    except (UnicodeDecodeError, FileNotFoundError):
+        return _content_result(file_path, find_keyword(file_path, pattern, max_len, dedupe))
+    except (OSError, ValueError):
         return False, f"Could not read {file_path}"
 
-def scan_project_directory(project_dir, dep_prefix="ag-grid"):
-    """扫描项目目录，检查 ag-grid 引入"""
+def load_scan_cache(cache_path):
+    """读取文件扫描结果缓存，关键字变化或文件损坏时返回空缓存"""
+    try:
+        with open(cache_path, 'rb') as f:
+            data = json_loads(f.read())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("keywords") != list(KEYWORDS):
+        return {}
+    files = data.get("files")
+    if not isinstance(files, dict):
+        return {}
+    # 丢弃格式不正确的条目，只保留 [mtime_ns, size, found, message]
+    return {
+        path: entry for path, entry in files.items()
+        if isinstance(entry, list) and len(entry) == 4
+        and isinstance(entry[0], int) and isinstance(entry[1], int)
+        and isinstance(entry[2], bool) and isinstance(entry[3], str)
+    }
+
+def save_scan_cache(cache_path, files):
+    """写入文件扫描结果缓存"""
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({"keywords": list(KEYWORDS), "files": files}, f)
+    except OSError as e:
+        print(f"Warning: could not write cache {cache_path}: {e}")
+
+def load_gitignore(project_dir):
+    """读取项目根目录的 .gitignore，返回匹配规则（无文件或未安装 pathspec 时返回 None）"""
+    if pathspec is None:
+        return None
+    try:
+        with open(os.path.join(project_dir, ".gitignore"), 'r', encoding='utf-8') as f:
+            return pathspec.GitIgnoreSpec.from_lines(f)
+    except (OSError, UnicodeDecodeError):
+        return None
+
+def _drain(futures, results):
+    """收集已提交任务的结果"""
+    for future in as_completed(futures):
+        results.extend(future.result())
+    futures.clear()
+
+def scan_project_directory(project_dir, dep_prefix="ag-grid", max_workers=None, cache_path=None, verbose=False,
+                           skip_suffixes=()):
+    """扫描项目目录，检查 ag-grid 引入；verbose 时被预筛选跳过的文件以 found=None 记入结果"""
     project_dir = Path(project_dir).resolve()
     results = []
+    if max_workers is None:
+        max_workers = (os.cpu_count() or 1) * 4
+    cache = load_scan_cache(cache_path) if cache_path else {}
+    new_cache = {}
+    root = str(project_dir)
+    ignore_spec = load_gitignore(root)
+
+    def check_package(path):
+        found, message = check_package_json(path, dep_prefix)
+        return [(path, found, message)]
 
-    # 查找所有 package.json 文件
-    for package_file in project_dir.rglob("package.json"):
-        found, message = check_package_json(package_file, dep_prefix)
-        results.append((package_file, found, message))
+    def check_content(path, mtime_ns, size, dedupe):
+        found, message = check_file_content(path, dedupe=dedupe)
+        if not message.startswith("Could not read"):
+            new_cache[path] = [mtime_ns, size, found, message]
+        return [(path, found, message)]
 
-    # 查找 HTML 和 JS 文件中的 CDN 或 import
-    for ext in ["*.html", "*.js", "*.jsx", "*.ts", "*.tsx"]:
-        for file in project_dir.rglob(ext):
-            found, message = check_file_content(file)
-            results.append((file, found, message))
+    # 单次遍历目录树，按文件名/扩展名分派检查；文件读取交给线程池并发执行
+    futures = []
+    seen_sizes = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in SKIP_DIRS:
+                        continue
+                    if ignore_spec is not None:
+                        rel = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                        if ignore_spec.match_file(rel + "/"):
+                            continue
+                    stack.append(entry.path)
+                elif entry.name == "package.json":
+                    futures.append(executor.submit(check_package, entry.path))
+                elif os.path.splitext(entry.name)[1] in CONTENT_EXTENSIONS:
+                    if skip_suffixes and entry.name.endswith(skip_suffixes):
+                        if verbose:
+                            results.append((entry.path, None, f"Skipped by suffix {entry.path}"))
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        # 例如失效的符号链接
+                        results.append((entry.path, False, f"Could not read {entry.path}"))
+                        continue
+                    if st.st_size < KEYWORDS_MIN_LEN:
+                        if verbose:
+                            results.append((entry.path, None, f"Skipped too small file {entry.path}"))
+                        continue
+                    cached = cache.get(entry.path)
+                    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                        new_cache[entry.path] = cached
+                        results.append((entry.path, cached[2], cached[3]))
+                    else:
+                        # 只有大小与之前文件相同的文件才可能是重复内容，才值得计算哈希
+                        dedupe = st.st_size in seen_sizes
+                        seen_sizes.add(st.st_size)
+                        futures.append(executor.submit(check_content, entry.path, st.st_mtime_ns, st.st_size,
+                                                       dedupe))
+                # 限制未完成任务数量，控制内存占用
+                if len(futures) >= MAX_PENDING:
+                    _drain(futures, results)
+        _drain(futures, results)
 
+    if cache_path:
+        # 保留其他项目目录的缓存条目，只替换本次扫描目录下的条目
+        root_prefix = os.path.join(root, "")
+        merged = {path: value for path, value in cache.items() if not path.startswith(root_prefix)}
+        merged.update(new_cache)
+        save_scan_cache(cache_path, merged)
+    # 线程池按完成顺序返回结果，排序后输出稳定：package.json 在前，其余按路径
+    results.sort(key=lambda r: (os.path.basename(r[0]) != "package.json", r[0]))
     return results
 
 def main():
     parser = argparse.ArgumentParser(description="Check for ag-grid in a local project directory.")
     parser.add_argument("project_dir", help="Path to the project directory to scan")
-    parser.add_argument("--dep", default="ag-grid", help="Dependency prefix to check (default: ag-grid)")
+    parser.add_argument("--dep", default="ag-grid", help="Dependency prefix(es) to check, comma-separated (default: ag-grid)")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="Number of concurrent threads. Default: 4 x CPU count")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Do not read or write the scan result cache ({CACHE_PATH})")
+    parser.add_argument("--verbose", action="store_true", help="Also list files skipped by the prefilter")
+    parser.add_argument("--skip-declarations", action="store_true",
+                        help="Skip *.d.ts files for speed (may miss type-only ag-grid imports)")
     args = parser.parse_args()
 
     project_dir = args.project_dir
     dep_prefix = args.dep
+    if not split_prefixes(dep_prefix):
+        parser.error("--dep must contain at least one non-empty prefix")
+    max_workers = args.max_workers
+    cache_path = None if args.no_cache else CACHE_PATH
+    verbose = args.verbose
+    skip_suffixes = DECLARATION_SUFFIXES if args.skip_declarations else ()
 
     if not os.path.exists(project_dir):
         print(f"Error: Directory {project_dir} does not exist")
         return
 
     print(f"Scanning {project_dir} for ag-grid usage...")
-    results = scan_project_directory(project_dir, dep_prefix)
+    results = scan_project_directory(project_dir, dep_prefix, max_workers, cache_path, verbose,
+                                     skip_suffixes)
 
     # 输出结果
     found_any = False
     print("\nResults:")
     for file_path, found, message in results:
-        if found:
+        if found is None:
+            print(f"[SKIPPED] {message}")
+        elif found:
             found_any = True
             print(f"[FOUND] {message}")
         else:
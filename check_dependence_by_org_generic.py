@@ -1,18 +1,94 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import sys
 import os
 import time
 import argparse
+import functools
+import sqlite3
+from itertools import chain
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
 
+try:
+    # orjson 序列化更快，未安装时回退到标准库 json
+    from orjson import dumps as json_dumps
+except ImportError:
+    def json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
-def get_org_repos(org, token=None):
+try:
+    # ijson 支持流式解析，命中后即可停止读取响应体；未安装时回退到完整解析
+    import ijson
+except ImportError:
+    ijson = None
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+# 每个 GraphQL 请求中查询的仓库数
+GRAPHQL_BATCH_SIZE = 50
+# 需要检查的依赖字段
+DEP_FIELDS = ("dependencies", "devDependencies")
+# 进度条每完成多少个仓库刷新一次，以及最短刷新间隔（秒）
+PROGRESS_BATCH = 50
+PROGRESS_INTERVAL = 0.2
+# 逐条写入的机器可读结果文件
+NDJSON_PATH = "output.ndjson"
+# 扫描结果缓存文件
+CACHE_PATH = ".scan_cache.db"
+# 剩余配额低于该值时等待配额重置
+RATE_LIMIT_THRESHOLD = 10
+# 等待时间超过该秒数时打印提示
+RATE_LIMIT_NOTICE_SECONDS = 5
+# 因配额耗尽被拒绝（403/429）时的最大重试次数
+RATE_LIMIT_RETRIES = 3
+
+
+def create_session(max_workers):
+    """
+    创建共享的 HTTP 会话，连接池大小与并发线程数一致，复用 TCP/TLS 连接。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    return session
+
+
+def wait_for_rate_limit(response, threshold=RATE_LIMIT_THRESHOLD):
+    """
+    根据 X-RateLimit-Remaining / X-RateLimit-Reset 响应头，在配额即将耗尽时等待至重置时间。
+    """
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    reset = response.headers.get("X-RateLimit-Reset")
+    if remaining is None or reset is None:
+        return
+    if int(remaining) < threshold:
+        delay = max(0, int(reset) - time.time())
+        if delay >= RATE_LIMIT_NOTICE_SECONDS:
+            print(f"\nGitHub rate limit nearly exhausted ({remaining} left), waiting {delay:.0f}s until reset...")
+        time.sleep(delay)
+
+
+def request_with_rate_limit(http, method, url, **kwargs):
+    """
+    发送请求并遵守速率限制；若因配额耗尽被拒绝（403/429 且剩余配额为 0），等待重置后重试。
+    """
+    for _ in range(RATE_LIMIT_RETRIES):
+        response = http.request(method, url, **kwargs)
+        wait_for_rate_limit(response)
+        if response.status_code not in (403, 429) or response.headers.get("X-RateLimit-Remaining") != "0":
+            break
+    return response
+
+
+def get_org_repos(org, token=None, session=None):
     """
     获取组织下所有公开仓库列表（处理分页）。
+    Returns: {full_name: pushed_at}
     """
-    repos = []
+    http = session or requests
+    repos = {}
     page = 1
     headers = {"Accept": "application/vnd.github+json"}
     if token:
@@ -21,61 +97,219 @@ def get_org_repos(org, token=None):
     while True:
         url = f"https://api.github.com/orgs/{org}/repos?per_page=100&page={page}"
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = request_with_rate_limit(http, "GET", url, headers=headers, timeout=10)
             response.raise_for_status()
             data = response.json()
             if not data:
                 break
             for repo_data in data:
-                repos.append(repo_data["full_name"])  # e.g., "bytedance/repo-name"
+                # e.g., "bytedance/repo-name"，pushed_at 用于判断缓存是否过期
+                repos[repo_data["full_name"]] = repo_data.get("pushed_at")
             page += 1
-            time.sleep(1)  # 延时避免速率限制
         except Exception as e:
             print(f"Error fetching repos for {org}: {e}")
             break
     return repos
 
 
-def check_dep_in_repo(repo, dep_prefix, branch="main", headers=None, timeout=10):
+def open_cache(path=CACHE_PATH):
+    """
+    打开（必要时创建）SQLite 扫描结果缓存。
+    """
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS scan_cache ("
+        "repo TEXT, branch TEXT, dep TEXT, pushed_at TEXT, status TEXT, ts INTEGER, "
+        "PRIMARY KEY (repo, branch, dep))"
+    )
+    return db
+
+
+def cache_lookup(db, repo, branch, dep_prefix, pushed_at):
+    """
+    查询缓存；仅当仓库自上次扫描后没有新的推送时返回缓存的状态，否则返回 None。
+    """
+    if pushed_at is None:
+        return None
+    row = db.execute(
+        "SELECT pushed_at, status FROM scan_cache WHERE repo = ? AND branch = ? AND dep = ?",
+        (repo, branch, dep_prefix),
+    ).fetchone()
+    if row is not None and row[0] == pushed_at:
+        return row[1]
+    return None
+
+
+def cache_store(db, repo, branch, dep_prefix, pushed_at, status):
+    """
+    写入扫描结果；Error 状态不缓存，下次运行会重试。
+    """
+    if pushed_at is None or status == "Error":
+        return
+    db.execute(
+        "INSERT OR REPLACE INTO scan_cache (repo, branch, dep, pushed_at, status, ts) VALUES (?, ?, ?, ?, ?, ?)",
+        (repo, branch, dep_prefix, pushed_at, status, int(time.time())),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def split_prefixes(dep_prefix):
+    """
+    将逗号分隔的依赖前缀拆分为元组，供 str.startswith 一次匹配多个前缀。
+    """
+    return tuple(p.strip() for p in dep_prefix.split(",") if p.strip())
+
+
+def has_status(key, prefixes):
+    """
+    返回依赖名命中的前缀对应的状态，多前缀时每个前缀单独分组。
+    """
+    return f"Has {next(p for p in prefixes if key.startswith(p))}"
+
+
+def parse_dep_status(text, dep_prefix):
+    """
+    解析 package.json 文本，判断是否包含指定依赖前缀。
+    Returns: status
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return "Error"
+    if not isinstance(data, dict):
+        return "Error"
+    prefixes = split_prefixes(dep_prefix)
+    # 只检查对象类型的依赖字段，与 stream_dep_status 的 map_key 判断一致
+    deps = data.get("dependencies")
+    dev_deps = data.get("devDependencies")
+    for key in chain(deps if isinstance(deps, dict) else (), dev_deps if isinstance(dev_deps, dict) else ()):
+        if key.startswith(prefixes):
+            return has_status(key, prefixes)
+    return f"No {dep_prefix}"
+
+
+def stream_dep_status(response, dep_prefix):
+    """
+    使用 ijson 流式解析响应体，找到匹配的依赖后立即停止读取。
+    Returns: status
+    """
+    prefixes = split_prefixes(dep_prefix)
+    response.raw.decode_content = True
+    try:
+        events = ijson.parse(response.raw)
+        first = next(events, None)
+        if first is None or first[1] != "start_map":
+            # 顶层不是对象，与 parse_dep_status 一致视为错误
+            return "Error"
+        for prefix, event, value in events:
+            if event == "map_key" and prefix in DEP_FIELDS and value.startswith(prefixes):
+                return has_status(value, prefixes)
+    except (ijson.JSONError, Urllib3HTTPError):
+        return "Error"
+    return f"No {dep_prefix}"
+
+
+def check_dep_in_repo(repo, dep_prefix, branch="HEAD", headers=None, timeout=10, session=None):
     """
     检查仓库的 package.json 是否存在，以及是否包含指定依赖前缀。
     Returns: (repo, status)
     """
+    http = session or requests
     url = f"https://raw.githubusercontent.com/{repo}/{branch}/package.json"
     try:
-        response = requests.get(url, headers=headers, timeout=timeout)
-        if response.status_code == 404:
-            return repo, "No package.json"
-        response.raise_for_status()
-        if response.status_code == 200:
-            try:
-                data = json.loads(response.text)
-                deps = data.get("dependencies", {})
-                dev_deps = data.get("devDependencies", {})
-                all_deps = {**deps, **dev_deps}
-                for key in all_deps:
-                    if key.startswith(dep_prefix):
-                        return repo, f"Has {dep_prefix}"
-                return repo, f"No {dep_prefix}"
-            except json.JSONDecodeError:
-                return repo, "Error"
+        with http.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 404:
+                return repo, "No package.json"
+            response.raise_for_status()
+            if response.status_code == 200:
+                if ijson is None:
+                    return repo, parse_dep_status(response.text, dep_prefix)
+                return repo, stream_dep_status(response, dep_prefix)
     except requests.RequestException:
         return repo, "Error"
 
 
+def check_deps_graphql(repos, dep_prefix, branch="HEAD", headers=None, timeout=30, session=None):
+    """
+    通过 GitHub GraphQL API 一次请求批量获取多个仓库的 package.json（需要 token）。
+    Returns: [(repo, status), ...]
+    """
+    http = session or requests
+    expression = json.dumps(f"{branch}:package.json")
+    fields = []
+    for i, repo in enumerate(repos):
+        owner, name = repo.split("/", 1)
+        fields.append(f"r{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) "
+                      f"{{ object(expression: {expression}) {{ ... on Blob {{ text }} }} }}")
+    query = "query { " + " ".join(fields) + " }"
+
+    try:
+        response = request_with_rate_limit(http, "POST", GRAPHQL_URL, json={"query": query}, headers=headers,
+                                           timeout=timeout)
+        response.raise_for_status()
+        data = response.json().get("data") or {}
+    except (requests.RequestException, ValueError):
+        return [(repo, "Error") for repo in repos]
+
+    results = []
+    for i, repo in enumerate(repos):
+        repository = data.get(f"r{i}")
+        if repository is None:
+            # 仓库不存在或无权访问
+            results.append((repo, "Error"))
+        elif repository["object"] is None:
+            results.append((repo, "No package.json"))
+        elif repository["object"].get("text") is None:
+            # 二进制或过大的 blob，GraphQL 不返回内容
+            results.append((repo, "Error"))
+        else:
+            results.append((repo, parse_dep_status(repository["object"]["text"], dep_prefix)))
+    return results
+
+
+def write_ndjson(out, org, repo, status):
+    """
+    以 NDJSON 格式追加一条结果，并立即刷新到磁盘，中途退出也不会丢失已写入的结果。
+    """
+    out.write(json_dumps({"org": org, "repo": repo, "status": status}) + b"\n")
+    out.flush()
+
+
+def format_results(all_results, dep_prefix):
+    """
+    逐行生成按组织和状态分组的结果文本。
+    """
+    yield f"Final Results for '{dep_prefix}' (grouped by organization and status):"
+    for org, status_groups in all_results.items():
+        yield ""
+        yield f"Organization: {org}"
+        for status, repos in status_groups.items():
+            if repos:
+                yield f"  {status}:"
+                for repo in sorted(repos):
+                    yield f"    {repo}"
+
+
 def main():
     parser = argparse.ArgumentParser(description="Check dependencies in GitHub organization repositories.")
     parser.add_argument("txt_file", help="Path to the txt file containing organization names (one per line).")
     parser.add_argument("--dep", default="ag-grid",
-                        help="Dependency prefix to check (e.g., 'ag-grid' or 'lodash'). Default: ag-grid")
-    parser.add_argument("--branch", default="main", help="Branch to check (e.g., 'main' or 'master'). Default: main")
+                        help="Dependency prefix(es) to check, comma-separated (e.g., 'ag-grid' or 'ag-grid,lodash'). "
+                             "Matches are grouped per prefix. Default: ag-grid")
+    parser.add_argument("--branch", default="HEAD",
+                        help="Branch to check (e.g., 'main' or 'master'). Default: HEAD (each repo's default branch)")
     parser.add_argument("--max-workers", type=int, default=5, help="Number of concurrent threads. Default: 5")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Do not read or write the scan result cache ({CACHE_PATH}).")
 
     args = parser.parse_args()
     txt_file = args.txt_file
     dep_prefix = args.dep
+    if not split_prefixes(dep_prefix):
+        parser.error("--dep must contain at least one non-empty prefix")
     branch = args.branch
     max_workers = args.max_workers
+    use_cache = not args.no_cache
 
     if not os.path.exists(txt_file):
         print(f"File not found: {txt_file}")
@@ -95,68 +329,92 @@ def main():
     if token:
         headers["Authorization"] = f"token {token}"
 
-    # 对于每个组织，获取仓库并检查
+    session = create_session(max_workers)
+    db = open_cache() if use_cache else None
+
+    # 对于每个组织，获取仓库并检查；结果同时逐条写入 output.ndjson
     all_results = {}
-    for org in orgs:
-        print(f"\nFetching repositories for organization: {org}")
-        repos = get_org_repos(org, token=token)
-        if not repos:
-            print(f"No repositories found for {org}")
-            continue
-
-        org_results = {}
-        total_repos = len(repos)
-        print(f"Found {total_repos} repositories. Checking for '{dep_prefix}'...")
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_repo = {executor.submit(check_dep_in_repo, repo, dep_prefix, branch, headers): repo for repo in
-                              repos}
-            for future in tqdm(as_completed(future_to_repo), total=total_repos, desc=f"Checking {org} repos"):
-                repo, status = future.result()
-                org_results[repo] = status
-                time.sleep(0.5)  # 额外延时避免速率限制
-
-        all_results[org] = org_results
-
-    # 按组织和状态分组输出
-    print(f"\nFinal Results for '{dep_prefix}' (grouped by organization and status):")
-    for org, results in all_results.items():
-        print(f"\nOrganization: {org}")
-        status_groups = {
-            f"Has {dep_prefix}": [],
-            f"No {dep_prefix}": [],
-            "No package.json": [],
-            "Error": []
-        }
-        for repo, status in sorted(results.items()):
-            status_groups[status].append(repo)
+    try:
+        with open(NDJSON_PATH, "wb") as ndjson_out:
+            for org in orgs:
+                print(f"\nFetching repositories for organization: {org}")
+                repo_versions = get_org_repos(org, token=token, session=session)
+                if not repo_versions:
+                    print(f"No repositories found for {org}")
+                    continue
 
-        for status, repos in status_groups.items():
-            if repos:
-                print(f"  {status}:")
-                for repo in sorted(repos):
-                    print(f"    {repo}")
+                # 按状态分组收集结果，输出时无需再次分组
+                org_results = {f"Has {prefix}": [] for prefix in split_prefixes(dep_prefix)}
+                org_results.update({
+                    f"No {dep_prefix}": [],
+                    "No package.json": [],
+                    "Error": []
+                })
+                repos = []
+                for repo, pushed_at in repo_versions.items():
+                    # 自上次扫描以来没有推送的仓库直接使用缓存结果
+                    status = cache_lookup(db, repo, branch, dep_prefix, pushed_at) if db is not None else None
+                    # 旧版本缓存的状态可能不在当前分组中，视为未命中
+                    if status in org_results:
+                        org_results[status].append(repo)
+                        write_ndjson(ndjson_out, org, repo, status)
+                    else:
+                        repos.append(repo)
+                total_repos = len(repos)
+                print(f"Found {len(repo_versions)} repositories ({len(repo_versions) - total_repos} cached). "
+                      f"Checking for '{dep_prefix}'...")
+
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    if token:
+                        # 有 token 时使用 GraphQL 批量查询，减少请求次数
+                        futures = [executor.submit(check_deps_graphql, repos[i:i + GRAPHQL_BATCH_SIZE], dep_prefix,
+                                                   branch, headers, session=session)
+                                   for i in range(0, total_repos, GRAPHQL_BATCH_SIZE)]
+                        with tqdm(total=total_repos, desc=f"Checking {org} repos",
+                                  mininterval=PROGRESS_INTERVAL) as pbar:
+                            for future in as_completed(futures):
+                                batch_results = future.result()
+                                for repo, status in batch_results:
+                                    org_results[status].append(repo)
+                                    write_ndjson(ndjson_out, org, repo, status)
+                                    if db is not None:
+                                        cache_store(db, repo, branch, dep_prefix, repo_versions[repo], status)
+                                pbar.update(len(batch_results))
+                    else:
+                        future_to_repo = {executor.submit(check_dep_in_repo, repo, dep_prefix, branch, headers,
+                                                          session=session): repo for repo in repos}
+                        with tqdm(total=total_repos, desc=f"Checking {org} repos",
+                                  mininterval=PROGRESS_INTERVAL) as pbar:
+                            batch = 0
+                            for future in as_completed(future_to_repo):
+                                repo, status = future.result()
+                                org_results[status].append(repo)
+                                write_ndjson(ndjson_out, org, repo, status)
+                                if db is not None:
+                                    cache_store(db, repo, branch, dep_prefix, repo_versions[repo], status)
+                                batch += 1
+                                if batch >= PROGRESS_BATCH:
+                                    pbar.update(batch)
+                                    batch = 0
+                            pbar.update(batch)
+
+                if db is not None:
+                    db.commit()
+
+                all_results[org] = org_results
+    finally:
+        if db is not None:
+            # 中断时也保存已完成的结果
+            db.commit()
+            db.close()
 
-    # 保存到 output.txt
+    # 按组织和状态分组输出，同时写入终端和 output.txt
     with open("output.txt", "w") as out:
-        out.write(f"Final Results for '{dep_prefix}' (grouped by organization and status):\n")
-        for org, results in all_results.items():
-            out.write(f"\nOrganization: {org}\n")
-            status_groups = {
-                f"Has {dep_prefix}": [],
-                f"No {dep_prefix}": [],
-                "No package.json": [],
-                "Error": []
-            }
-            for repo, status in sorted(results.items()):
-                status_groups[status].append(repo)
-
-            for status, repos in status_groups.items():
-                if repos:
-                    out.write(f"  {status}:\n")
-                    for repo in sorted(repos):
-                        out.write(f"    {repo}\n")
-    print("\nResults saved to output.txt")
+        print()
+        for line in format_results(all_results, dep_prefix):
+            print(line)
+            out.write(line + "\n")
+    print(f"\nResults saved to output.txt and {NDJSON_PATH}")
 
 
 if __name__ == "__main__":